@@ -1,4 +1,6 @@
 """imports"""
+import os
+import tempfile
 import unittest
 from whispr import *
 
@@ -19,3 +21,99 @@ class MyTests(unittest.TestCase):
 
         vol_table = generateVolumeTable(mixing_table_df, source_plate_df) # TODO : real test
         self.assertTrue(True)
+
+    def test_fill_source_wells(self):
+
+        # first well can give 3.5ul, so the 4th 1ul transfer moves to the second well
+        slots, n_placed = fill_source_wells(np.array([1.0, 1.0, 1.0, 1.0]), np.array([3.5, 10.0]))
+        self.assertEqual(list(slots), [0, 0, 0, 1])
+        self.assertEqual(n_placed, 4)
+
+        # single well runs out after the first transfer
+        slots, n_placed = fill_source_wells(np.array([1.0, 1.0]), np.array([1.5]))
+        self.assertEqual(n_placed, 1)
+
+    def small_source_plate(self, x_vols = ('20', '60')):
+        # X has a concentrated and a dilute stock, Y a single stock
+        sp = pd.DataFrame({'Label': ['X_hi', 'X_lo', 'Y', 'Water'],
+                           'Well': ['A1', 'A2', 'A3', 'A4'],
+                           'Concentration': [100.0, 10.0, 50.0, 1.0],
+                           'Volume': [x_vols[0], x_vols[1], '60', '60']},
+                          index = pd.Index(['X', 'X', 'Y', 'Water'], name = 'Item'))
+        return sp
+
+    def test_generateVolumeTable_stocks(self):
+
+        # r1 rounds to 0 from X_hi so takes X_lo, r2 brings X_hi down to the minimum so r3 skips it
+        mt = pd.DataFrame({'X': [0.1, 20.0, 2.0], 'Y': [5.0, 0.0, 1.0]}, index = ['r1', 'r2', 'r3'])
+        vol_table = generateVolumeTable(mt, self.small_source_plate())
+
+        self.assertEqual(list(vol_table.columns), ['Label', 'X_hi', 'X_lo', 'Y', 'Water'])
+        self.assertEqual(list(vol_table['Label']), ['r1', 'r2', 'r3'])
+        np.testing.assert_allclose(vol_table[['X_hi', 'X_lo', 'Y', 'Water']].to_numpy(),
+                                   [[0.0, 0.1, 1.0, 1.4],
+                                    [2.0, 0.0, 0.0, 0.5],
+                                    [0.0, 2.0, 0.2, 0.3]])
+
+    def test_generateVolumeTable_errors(self):
+
+        # both stocks of X are already at the minimum volume
+        mt = pd.DataFrame({'X': [1.0], 'Y': [0.0]}, index = ['r1'])
+        with self.assertRaises(NameError) as err:
+            generateVolumeTable(mt, self.small_source_plate(x_vols = ('18', '18')))
+        self.assertEqual(str(err.exception), 'Need more volume of X to complete reaction r1. Add another well to source plate.')
+
+        # both stocks of X run down to the minimum, but r3 adds no X so it still goes through
+        mt = pd.DataFrame({'X': [20.0, 2.0, 0.0], 'Y': [1.0, 1.0, 1.0]}, index = ['r1', 'r2', 'r3'])
+        vol_table = generateVolumeTable(mt, self.small_source_plate(x_vols = ('20', '20')))
+        np.testing.assert_allclose(vol_table[['X_hi', 'X_lo', 'Y', 'Water']].to_numpy(),
+                                   [[2.0, 0.0, 0.2, 0.3],
+                                    [0.0, 2.0, 0.2, 0.3],
+                                    [0.0, 0.0, 0.2, 2.3]])
+
+        # rounds to 0 from every stock of X
+        mt = pd.DataFrame({'X': [0.001], 'Y': [0.0]}, index = ['r1'])
+        with self.assertRaises(NameError) as err:
+            generateVolumeTable(mt, self.small_source_plate())
+        self.assertEqual(str(err.exception), 'Mate you need a more dilute stock of X')
+
+        # 4ul of Y does not fit in a 2.5ul reaction
+        mt = pd.DataFrame({'X': [0.0], 'Y': [20.0]}, index = ['r1'])
+        with self.assertRaises(NameError) as err:
+            generateVolumeTable(mt, self.small_source_plate())
+        self.assertTrue(str(err.exception).startswith('Volume of r1 exceeds 2.5ul. Total volume is 4.0'))
+
+    def test_writeProtocol(self):
+
+        # B comes first in A10, so the volumes of A1 must not end up on its row
+        def source_plate(vols_a = '20,60'):
+            return pd.DataFrame({'Label': ['B', 'A'], 'Well': ['A10', 'A1,A2'],
+                                 'Concentration': [1.0, 1.0], 'Volume': ['60', vols_a]},
+                                index = pd.Index(['B', 'A'], name = 'Item'))
+
+        vol_table = pd.DataFrame({'Label': ['rxn1', 'rxn2'], 'A': [1.0, 0.5], 'B': [0.5, 0.0]})
+        # rxn1 in two wells of the first layout, rxn2 in both layouts
+        layout_1 = pd.DataFrame({'1': ['rxn1', 'rxn2'], '2': ['rxn1', None]}, index = ['C', 'D'])
+        layout_2 = pd.DataFrame({'1': ['rxn2']}, index = ['E'])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            update = os.path.join(tmp, 'sp.xlsx')
+            protocol = writeProtocol('384PP_AQ_BP', vol_table, [layout_1, layout_2], source_plate(), update_source_vol = update)[0]
+            new_vols = pd.read_excel(update, index_col = 0)['New Volume']
+
+        # A1 can give 2ul above the minimum, so the second 1ul transfer of A moves on to A2 for good
+        self.assertEqual(list(protocol.columns), OUT_COLS)
+        self.assertEqual(protocol[['Source Well', 'Destination Plate Name', 'Destination Well', 'Transfer Volume']].values.tolist(),
+                         [['A1', 'Destination[1]', 'C1', 1000.0],
+                          ['A10', 'Destination[1]', 'C1', 500.0],
+                          ['A2', 'Destination[1]', 'C2', 1000.0],
+                          ['A10', 'Destination[1]', 'C2', 500.0],
+                          ['A2', 'Destination[1]', 'D1', 500.0],
+                          ['A2', 'Destination[2]', 'E1', 500.0]])
+        self.assertTrue((protocol['Source Plate Name'] == 'Source[1]').all())
+        self.assertEqual(new_vols.to_dict(), {'B': '59.0,', 'A': '19.0,58.0,'})
+
+        # A1 can only give 1ul, which is not enough for the first transfer
+        with self.assertRaises(NameError) as err:
+            writeProtocol('384PP_AQ_BP', vol_table, [layout_1, layout_2], source_plate(vols_a = '19'))
+        self.assertEqual(str(err.exception), 'Need more volume of A to complete reaction rxn1. Add another well to source plate.')
@@ -28,8 +28,7 @@ sp_buffers= pd.read_excel(sp_buffers_file, index_col = 0)
 sp_buffers = sp_buffers[~sp_buffers['Well'].isna()]
 
 # HEPES reservoir (actually same plate as Tris)
-sp_hepes = pd.DataFrame(columns=sp_buffers.columns)
-sp_hepes = sp_hepes.append({'Label':'HEPES', 'Well':'A2,A3', 'Concentration':'', 'Volume':'2000,2000'}, ignore_index = True)
+sp_hepes = pd.DataFrame([{'Label':'HEPES', 'Well':'A2,A3', 'Concentration':'', 'Volume':'2000,2000'}], columns=sp_buffers.columns)
 
 # gene expression source plate (diluted w/ Tris)
 sp_genex = sp_from_layout(layout_genex, 60)
@@ -2,9 +2,102 @@ from tokenize import Name
 import pandas as pd
 import numpy as np
 
+# needs pandas >= 2.0 (DataFrame.append is gone), copy-on-write is opt in on 2.x and always on from 3.0
+if pd.__version__.split('.')[0] == '2':
+    pd.options.mode.copy_on_write = True
+
+try:
+    from numba import njit
+except ImportError:
+    # numba is optional, without it the compiled kernels below run as plain python
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda f: f
+
+#Columns of the ECHO protocol, in the order the instrument expects them
+OUT_COLS = ['Source Plate Name', 'Source Plate Type', 'Source Well',
+            'Destination Plate Name', 'Destination Well', 'Transfer Volume']
+
 #This function rounds to the nearest .025 as the ECHO only adds in .025ul increments.
+#Works on scalars and arrays alike, so whole volume tables can be rounded in one call.
 def myround(x, prec=3, base=.025):
-    return round(base * round(float(x)/base),prec)
+    return np.round(base * np.round(np.asarray(x, dtype = np.float64)/base),prec)
+
+@njit(cache = True)
+def round_echo(x):
+    # scalar myround for use inside compiled kernels
+    return np.round(.025 * np.round(x/.025), 3)
+
+@njit(cache = True)
+def walk_volumes(mixing_table, vols, source_indx, walk, concs, n_sources, source_label, running_vols, n_wells,
+                 fill_label, total_vol, rxn_vol, min_well_vol):
+    '''
+    Picks the stock of each walked cell of the volume table, reaction by reaction, while keeping track of the volume
+    left in each source well. vols and source_indx are updated in place.
+
+    Parameters:
+    -----------
+    mixing_table: (reactions x components) concentrations to add
+    vols, source_indx: (reactions x components) volumes and stock index from the most concentrated stock
+    walk: (reactions x components) cells whose stock has to be picked here
+    concs, source_label: (components x stocks) concentrations sorted high to low and the label row of each stock
+    running_vols: (labels x wells) volume left in each well, n_wells the number of wells of each label
+    fill_label: label row to fill each reaction up to rxn_vol from, -1 for no fill and -2 to fill without tracking volume
+
+    Output:
+    --------
+    Fill volume of each reaction, an error code (0 ok, 1 out of volume, 2 no dilute enough stock, 3 reaction
+    volume too high) and the reaction and component it happened on
+    '''
+    n_rxns, n_comps = mixing_table.shape
+    fill_vols = np.zeros(n_rxns)
+    for i in range(n_rxns):
+        for j in range(n_comps):
+            if not walk[i, j]:
+                continue
+            conc_to_add = mixing_table[i, j]
+            if conc_to_add == 0:
+                continue
+            k = 0
+            if n_sources[j] > 1:
+                # skip stocks whose wells are all at the minimum volume
+                while np.max(running_vols[source_label[j, k], :n_wells[source_label[j, k]]]) <= min_well_vol:
+                    k += 1
+                    if k >= n_sources[j]:
+                        return fill_vols, 1, i, j
+
+            vol_to_add = round_echo(total_vol*conc_to_add/concs[j, k])
+            # this may round to zero, so need to check for more dilute wells
+            while conc_to_add > 0 and vol_to_add == 0:
+                k += 1
+                if k >= n_sources[j]:
+                    return fill_vols, 2, i, j
+                vol_to_add = round_echo(total_vol*conc_to_add/concs[j, k])
+
+            vols[i, j] = vol_to_add
+            source_indx[i, j] = k
+            draw_volume(running_vols, n_wells, source_label[j, k], vol_to_add, min_well_vol)
+
+        vol = np.sum(vols[i])
+        if round(vol, 3) > rxn_vol:
+            return fill_vols, 3, i, -1
+        if fill_label != -1:
+            fill_vols[i] = round_echo(rxn_vol - vol)
+            if fill_label >= 0:
+                draw_volume(running_vols, n_wells, fill_label, fill_vols[i], min_well_vol)
+
+    return fill_vols, 0, -1, -1
+
+@njit(cache = True)
+def draw_volume(running_vols, n_wells, label, vol_to_add, min_well_vol):
+    # take from the first well that is still above the minimum volume, or the last well if none are
+    well = n_wells[label] - 1
+    for w in range(n_wells[label]):
+        if running_vols[label, w] > min_well_vol:
+            well = w
+            break
+    running_vols[label, well] -= vol_to_add
 
 def checkInputs(source_plate, mixing_table_df, plate_type = '384PP_AQ_BP'):
 
@@ -48,19 +141,20 @@ def checkInputs(source_plate, mixing_table_df, plate_type = '384PP_AQ_BP'):
                 vol_min = 250
                 vol_max = 2800
 
-            vol = []
-            for component in list(sp['Volume']):
-                if type(component) == str:
-                    c = component.split(',')
-                    for i in c:
-                        vol.append(float(i))
-                else:
-                    vol.append(component)
-                    
-            if any([v > vol_max for v in vol]):
-                raise NameError('Volumes of source plate '+str(k)+' are above working volume range.')
-            if any([v < vol_min for v in vol]):
-                raise NameError('Volumes of source plate '+str(k)+' are below working volume range.')
+            # one entry per well, numeric columns are used as they are, comma separated volumes are split first
+            col = sp['Volume']
+            if pd.api.types.is_numeric_dtype(col):
+                vols = col.to_numpy(dtype = np.float64)
+            else:
+                vols = col.astype(str).str.split(',').explode().astype(float).to_numpy()
+            vols = vols[~np.isnan(vols)]
+            if vols.size == 0:
+                continue
+
+            if vols.max() > vol_max:
+                raise NameError('Volumes of source plate '+str(k)+' are above working volume range ('+str(vols[np.argmax(vols)])+').')
+            if vols.min() < vol_min:
+                raise NameError('Volumes of source plate '+str(k)+' are below working volume range ('+str(vols[np.argmin(vols)])+').')
         
         if not np.all([m in combine_sps(source_plate)['Label'] for m in mixing_table_df.columns]):
             raise NameError('Source plate does not contain some items in the mixing table')
@@ -89,97 +183,106 @@ def generateVolumeTable(mixing_table_df, source_plate_df, rxn_vol = 2.5, total_v
     if type(source_plate_df) is list:
         source_plate_df = combine_sps(source_plate_df)
 
-    running_source_plate = source_plate_df.copy(deep = True)
-
-    vol_table = []
-    vol_table_df = pd.DataFrame(columns = ['Label'] + list(running_source_plate['Label']))
-
-    for row in mixing_table_df.index:
-
-        vol_table_df = vol_table_df.append({'Label': str(row)}, ignore_index = True)    
-        vol = 0
-
-        for column in mixing_table_df.columns:
-            conc_to_add = float(mixing_table_df.loc[row][column])
-            label_indx = 0
-            conc_of_source = running_source_plate.loc[column]['Concentration']
-            if (type(conc_of_source) != np.float64) and (type(conc_of_source) != float):
-                while running_source_plate.loc[column].sort_values(ascending = False, by = 'Concentration')['Volume'][label_indx] <= min_well_vol:
-                    label_indx += 1
-                else: 
-                    conc_of_source = conc_of_source.sort_values(ascending = False)[label_indx]
-                    
-            #conc_of_source = source_plate_df[source_plate_df['Label'] == column]['Concentration'].sort_values(ascending = False)[label_indx]
-            vol_to_add = myround(total_vol*conc_to_add/conc_of_source)
-            # this may round to zero, so need to check for more dilute wells 
-            while conc_to_add > 0 and vol_to_add == 0:
-                if type(running_source_plate.loc[column]['Concentration']) == np.float64:
-                    raise NameError('Mate you need a more dilute stock of '+column)
-                else:
-                    label_indx += 1
-                    if label_indx >= len(running_source_plate.loc[column]['Concentration']):
-                        raise NameError('Mate you need a more dilute stock of '+column)
-                    else:
-                        conc_of_source = running_source_plate.loc[column]['Concentration'].sort_values(ascending = False)[label_indx]
-                vol_to_add = myround(total_vol*conc_to_add/conc_of_source)
-
-            label = running_source_plate[running_source_plate['Concentration'] == conc_of_source].loc[column]['Label']
-           # label = source_plate_df[source_plate_df['Concentration'] == conc_of_source]
-            vol_table_df.loc[vol_table_df['Label'] == row,label] = vol_to_add
-            
-            running_source_plate=running_source_plate.reset_index(level=0).set_index('Label')
-            if type(running_source_plate.loc[label, 'Volume']) == str: 
-                current_vols = np.array(list(map(float,running_source_plate.loc[label, 'Volume'].split(','))))
-                current_vols[np.where(current_vols>min_well_vol)[0][0]] = current_vols[np.where(current_vols>min_well_vol)[0][0]] - vol_to_add
-                running_source_plate.loc[label, 'Volume'] = ','.join(list(map(str,current_vols)))
-            else:
-                running_source_plate.loc[label, 'Volume'] = running_source_plate.loc[label, 'Volume'] - vol_to_add
-            running_source_plate=running_source_plate.reset_index(level=0).set_index('Item') 
-            vol+=vol_to_add
+    vol_table_cols = ['Label'] + list(source_plate_df['Label'])
+    if fill_with and fill_with not in vol_table_cols:
+        vol_table_cols.append(fill_with)
+    label_pos = {label: k for k, label in enumerate(vol_table_cols[1:])}
+
+    # index the source plate once: for each component, its stocks sorted from most to least concentrated,
+    # padded into (components x stocks) arrays with the label row of each stock
+    n_comps = len(mixing_table_df.columns)
+    sp_labels = source_plate_df['Label'].to_numpy()
+    sp_concs = source_plate_df['Concentration'].to_numpy()
+    rows_of = source_plate_df.groupby(level = 0, sort = False).indices
+    by_comp = []
+    for component in mixing_table_df.columns:
+        if component not in rows_of:
+            raise NameError('Source plate does not contain ' + str(component))
+        rows = rows_of[component]
+        conc = sp_concs[rows].astype(np.float64)
+        order = np.argsort(-conc, kind = 'stable')
+        by_comp.append((conc[order], [label_pos[label] for label in sp_labels[rows][order]]))
+
+    n_sources = np.array([len(conc) for conc, _ in by_comp], dtype = np.int64)
+    concs = np.full((n_comps, max(n_sources, default = 1)), -np.inf)
+    source_label = np.zeros(concs.shape, dtype = np.int64)
+    for j, (conc, labels) in enumerate(by_comp):
+        concs[j, :len(conc)] = conc
+        source_label[j, :len(labels)] = labels
+
+    # running volume of each well, per label, so depleted sources are skipped
+    well_vols = [[float(v) for v in str(vols).split(',')] for vols in source_plate_df['Volume']]
+    n_wells = np.array([len(v) for v in well_vols], dtype = np.int64)
+    running_vols = np.full((len(well_vols), max(n_wells, default = 1)), np.nan)
+    for l, v in enumerate(well_vols):
+        running_vols[l, :len(v)] = v
+
+    mixing_table = mixing_table_df.to_numpy(dtype = np.float64)
+    top_conc = concs[:, 0]
+    missing_conc = ~(top_conc > 0)
+    if np.any(missing_conc):
+        raise NameError('Concentration of '+ str(mixing_table_df.columns[np.argmax(missing_conc)])+ ' in source plate is missing or zero')
+
+    # volumes of every reaction from the most concentrated stock of each component, in one pass
+    vols = myround(total_vol*mixing_table/top_conc)
+    source_indx = np.zeros(vols.shape, dtype = np.int64)
+
+    # components with several stocks are picked by running volume and volumes that round to zero
+    # need a more dilute stock, so only these cells (when the component is added at all) are walked one by one
+    walk = ((n_sources > 1)[None, :] | (vols == 0)) & (mixing_table > 0)
+
+    if not fill_with:
+        fill_label = -1
+    else:
+        fill_label = label_pos[fill_with] if label_pos[fill_with] < len(well_vols) else -2
+
+    fill_vols, error, i, j = walk_volumes(mixing_table, vols, source_indx, walk, concs, n_sources, source_label,
+                                          running_vols, n_wells, fill_label, float(total_vol), float(rxn_vol), float(min_well_vol))
+    if error == 1:
+        raise NameError('Need more volume of ' + mixing_table_df.columns[j] + ' to complete reaction ' + str(mixing_table_df.index[i]) + '. Add another well to source plate.')
+    if error == 2:
+        raise NameError('Mate you need a more dilute stock of '+mixing_table_df.columns[j])
+    if error == 3:
+        row = mixing_table_df.index[i]
+        vol = vols[i].sum()
+        print(pd.DataFrame(vols[[i]], index = [row], columns = mixing_table_df.columns).to_markdown())
+        raise NameError('Volume of '+ row+ ' exceeds '+str(rxn_vol) + 'ul. Total volume is '+ str(round(vol,3))+' Please change volumes and try again.')
+
+    # place each volume under the label of the stock it was taken from and build the table once
+    vol_table = np.zeros((len(mixing_table), len(label_pos)))
+    vol_table[np.arange(len(mixing_table))[:, None], source_label[np.arange(n_comps)[None, :], source_indx]] = vols
+    if fill_with:
+        vol_table[:, label_pos[fill_with]] = fill_vols
+
+    vol_table_df = pd.DataFrame(vol_table, columns = vol_table_cols[1:])
+    vol_table_df.insert(0, 'Label', [str(row) for row in mixing_table_df.index])
 
-        if round(vol,3) > rxn_vol:
-            print(vol_table_df.loc[vol_table_df['Label'] == row].to_markdown())
-            raise NameError('Volume of '+ row+ ' exceeds '+str(rxn_vol) + 'ul. Total volume is '+ str(round(vol,3))+' Please change volumes and try again.')
-        else:
-            if fill_with:
-                vol_table_df.loc[vol_table_df['Label'] == row,fill_with] = myround(rxn_vol - vol)
-                
-                running_source_plate=running_source_plate.reset_index(level=0).set_index('Label')
-                if type(running_source_plate.loc[fill_with, 'Volume']) == str: 
-                    current_vols = np.array(list(map(float,running_source_plate.loc[fill_with, 'Volume'].split(','))))
-                    current_vols[np.where(current_vols>min_well_vol)[0][0]] = current_vols[np.where(current_vols>min_well_vol)[0][0]] - myround(rxn_vol - vol)
-                    running_source_plate.loc[fill_with, 'Volume'] = ','.join(list(map(str,current_vols)))
-                else:
-                    running_source_plate.loc[fill_with, 'Volume'] = running_source_plate.loc[fill_with, 'Volume'] - myround(rxn_vol - vol)
-                running_source_plate=running_source_plate.reset_index(level=0).set_index('Item')
-    
     if multiRpW:
-        for i in range(len(vol_table_df)):
+        nrxn = np.ones(len(vol_table_df))
+        for i, label in enumerate(vol_table_df['Label'].to_numpy()):
             try: 
-                nrxn = int(vol_table_df['Label'][i].split('_')[0])
+                nrxn[i] = int(label.split('_')[0])
             except:
-                nrxn = 1
-            vol_table_df.iloc[i,1:] = vol_table_df.iloc[i,1:]*nrxn
+                nrxn[i] = 1
+        vol_table_df.iloc[:,1:] = vol_table_df.iloc[:,1:].to_numpy()*nrxn[:,None]
 
     return vol_table_df
 
+def layout_wells(layout):
+    '''
+    Reads a plate layout (read with dtype = str) and lists the wells of each label, labels and wells in plate order
+    '''
+    plate = layout.stack().dropna()
+    wells = plate.index.get_level_values(0).astype(str) + plate.index.get_level_values(1).astype(str)
+    return pd.Series(wells, index = plate.values).groupby(level = 0, sort = False).apply(list).to_dict()
+
 def sp_from_layout(layout, volumes):
-    sp = pd.DataFrame()
-
-    labels = pd.unique(np.concatenate(layout.values))
-    exps = {}
-    xlbl = []
-    for l in labels:
-        if type(l) is str:
-            xlbl.append(l)
-            index = layout[layout.isin([l])].stack().index
-            exps[l] = []
-            for i in index:
-                exps[l].append(str(i[0]) + i[1])
+    exps = layout_wells(layout)
 
     if (type(volumes) is int) or (type(volumes) is float):
-        for label, wells in exps.items():
-            sp = sp.append({'Label':label, 'Well':','.join(wells), 'Concentration':100, 'Volume':','.join([str(volumes)]*len(wells))}, ignore_index = True)
+        rows = [{'Label':label, 'Well':','.join(wells), 'Concentration':100, 'Volume':','.join([str(volumes)]*len(wells))}
+                for label, wells in exps.items()]
+        sp = pd.DataFrame(rows, columns = ['Label', 'Well', 'Concentration', 'Volume'])
     else:
         raise NameError('volumes type not supported yet')
 
@@ -194,6 +297,35 @@ def combine_sps(list_source_plates):
     sp.index.name = 'Item'
     return sp
 
+def fill_source_wells(transfer_vols, well_caps):
+    '''
+    Assigns each transfer of one component, in order, to one of its source wells. A well is used until the
+    next transfer would bring it to its minimum volume, that transfer and the ones after it go to the next well.
+
+    Parameters:
+    -----------
+    transfer_vols: array of transfer volumes (ul) in protocol order
+    well_caps: usable volume (ul) of each source well, in the order the wells are used
+
+    Output:
+    --------
+    Array with the well index of each transfer, and the number of transfers that could be placed
+    '''
+    n_transfers = len(transfer_vols)
+    slots = np.zeros(n_transfers, dtype = int)
+    start = 0
+    for k, cap in enumerate(well_caps):
+        if start >= n_transfers:
+            break
+        # transfers fit while the running total stays below what the well can give
+        n_fit = np.searchsorted(np.cumsum(transfer_vols[start:]), cap, side = 'left')
+        if k > 0:
+            # the transfer that did not fit the previous well always goes to this one
+            n_fit = max(n_fit, 1)
+        slots[start:start + n_fit] = k
+        start += n_fit
+    return slots, start
+
 def writeProtocol(plate_type, vol_table, output_layout,source_plate_df, update_source_vol = None):
         '''
         Writes protocol for use with ECHO plate reader
@@ -225,9 +357,6 @@ def writeProtocol(plate_type, vol_table, output_layout,source_plate_df, update_s
         source_plate_df = combine_sps(source_plate_df)
 
 
-        running_source_plate = source_plate_df.copy(deep = True)
-
-
         # check source plate type and set volume range
         def get_vol_min(plate_type):
             if 'LDV' in plate_type:
@@ -241,51 +370,37 @@ def writeProtocol(plate_type, vol_table, output_layout,source_plate_df, update_s
 
             return vol_min
 
-        # keep track of volume used for each component
-        vol_used = {}
-        well_list = ''
-        for p,k in zip(running_source_plate['PlateID'],list(running_source_plate['Well'])):
-            p = str(p)
-            if type(k) is str:
-                well_list += p+'_'+k.replace(' ','').replace(',',','+p+'_') + ','
-        well_list = well_list[:-1].split(',')
-
-        vol_list = ''
-        for k in list(running_source_plate['Volume']):
-            if (type(k) is int) or (type(k) is float):
-                vol_list += str(k) + ','
-            if type(k) is str:
-                vol_list += k.replace(' ','') + ','
-        vol_list = vol_list[:-1].split(',')
-
-        for k in well_list:
-            vol_used[k] = 0
-
-        vol_left = dict(zip(well_list, map(float,vol_list)))
-
-        # subtract from volume in source plate file 
-        well_vols = {}
-        for component in list(running_source_plate['Label']):
-            well_vols[component] = str(list(running_source_plate[running_source_plate['Label'] == component]['Volume'])[0]).split(',')
-
-        # create output dataframe
-        output_df = pd.DataFrame(columns = {'Source Plate Name', 'Source Plate Type', 'Source Well', 
-                                        'Destination Plate Name', 'Destination Well', 'Transfer Volume'})
-                                        
+        # source plate as parallel arrays, one entry per label, so lookups while writing the protocol are plain indexing
+        label_idx = {label: i for i, label in enumerate(source_plate_df['Label'].to_numpy())}
+        plate_for = source_plate_df['PlateID'].to_numpy()
+        wells_for = [str(w).replace(' ','').split(',') for w in source_plate_df['Well'].to_numpy()]
+        vols_for = [str(v).replace(' ','').split(',') for v in source_plate_df['Volume'].to_numpy()]
+
+        # keep track of volume used and left in each source well, and the source plate row it is on
+        vol_left = {}
+        well_row = {}
+        for i, w in enumerate(source_plate_df['Well'].to_numpy()):
+            if type(w) is str:
+                for well, v in zip(wells_for[i], vols_for[i]):
+                    vol_left[str(plate_for[i])+'_'+well] = float(v)
+                    well_row[str(plate_for[i])+'_'+well] = i
+        vol_used = dict.fromkeys(vol_left, 0)
+
+        vt = vol_table.set_index('Label')
+        vol_labels = set(vt.index.to_numpy())
+        vt_vals = vt.to_numpy(dtype = np.float64)
+        vt_row = {label: i for i, label in enumerate(vt.index.to_numpy())}
+        components = vt.columns.to_numpy()
+
+        # collect every transfer in protocol order, source wells are assigned per component afterwards
+        transfers = []
 
         if type(output_layout) is not list:
             output_layout = [output_layout]
 
         for layout_id, layout in enumerate(output_layout):    
             # reads plate layout and assigns wells to each reaction (rxn_loc; dict)
-            labels = pd.unique(np.concatenate(layout.values))
-            rxn_loc = {}
-            for l in labels:
-                if type(l) is str:
-                    index = layout[layout.isin([l])].stack().index
-                    rxn_loc[l] = []
-                    for i in index:
-                        rxn_loc[l].append(str(i[0]) + str(i[1]))
+            rxn_loc = layout_wells(layout)
 
 
 
@@ -296,71 +411,80 @@ def writeProtocol(plate_type, vol_table, output_layout,source_plate_df, update_s
                         for each component in the reaction:
                             find volume to transfer of component
                             if any volume is added:
-                                if there is one source well:
-                                    if the volume used of this component is less than the volume range:
-                                        append row
-                                if there is more than one source well:
-                                    if the volume used of this component is less than the volume range:
-                                        append row
-                                    else:
-                                        remove first source well
-                                        append row
-                                update volume used
-                                append output dataframe                    
-
-            ''' 
-
-            rxn_keys = list(rxn_loc.keys())
-            for rxn in rxn_keys:
-                if rxn in list(vol_table['Label']): 
-                    for well in rxn_loc[rxn]: 
-                        vols = vol_table[vol_table['Label'] == rxn]
-                        for component in vols.columns[1:]: 
-                            transfer_vol = float(vols[component])      
-                            if transfer_vol > 0:
-                                row = running_source_plate[running_source_plate['Label'] == component]
-                            ## separate if there is > 1 well in source plate
-                                source_well = list(row['Well'])
-                                if not type(source_well[0]) == list: source_well = source_well[0].split(',')
-
-                                ## use first well unless the well is empty, then use second well
-                                index = 0
-                                
-                                # check if volume used leaves volume below minimum
-                                if vol_used[str(row['PlateID'][0])+'_'+source_well[0]] + transfer_vol >= float(well_vols[component][0]) - get_vol_min(plate_type[row['PlateID'][0]-1]):
-                                    # print(vol_used[source_well[0]], transfer_vol)
-                                    # print(source_well)
-                                    if len(source_well) <= 1:
-                                        raise NameError('Need more volume of ' +component+ ' to complete reaction ' + rxn + '. Add another well to source plate.')
-
-                                    running_source_plate.loc[running_source_plate['Label'] == component,'Well'] = ','.join(source_well[1:]).replace(' ','')
-                                    well_vols[component] = well_vols[component][1:]
-                                    index = 1
-    
-                                echo_command = {'Source Plate Name':'Source['+str(row['PlateID'][0])+']', 'Source Plate Type': plate_type[row['PlateID'][0]-1], 'Source Well': source_well[index],
-                                    'Destination Plate Name':'Destination['+str(layout_id+1)+']', 'Destination Well': well, 'Transfer Volume': transfer_vol*1000}
-
-                                vol_used[str(row['PlateID'][0])+'_'+source_well[index]] = vol_used[str(row['PlateID'][0])+'_'+source_well[index]] + transfer_vol
-
-                                output_df = output_df.append(echo_command, ignore_index = True)
+                                append transfer
 
+            then for each component:
+                use the first source well until the volume used would leave it below the minimum,
+                then move on to the next source well (fill_source_wells)
+                raise if there are no source wells left
 
-        output_df = output_df[['Source Plate Name', 'Source Plate Type', 'Source Well', 
-                                'Destination Plate Name', 'Destination Well', 'Transfer Volume']]
-
+            ''' 
 
-        for v in vol_used:
-            vol_used[v] = myround(vol_used[v])
-            vol_left[v] -= vol_used[v]
+            rxn_keys = [rxn for rxn in rxn_loc.keys() if rxn in vol_labels]
+            if rxn_keys:
+                # columns collected per reaction and joined once per layout
+                labels, dest, vols, rxns = [], [], [], []
+                for rxn in rxn_keys:
+                    values = vt_vals[vt_row[rxn]]
+                    # only components that are actually transferred
+                    nz = np.flatnonzero(values > 0)
+                    # every destination well of the reaction gets the same transfers, well by well
+                    dest_wells = rxn_loc[rxn]
+                    labels.append(np.tile(components[nz], len(dest_wells)))
+                    dest.append(np.repeat(np.array(dest_wells, dtype = object), len(nz)))
+                    vols.append(np.tile(values[nz], len(dest_wells)))
+                    rxns.append(np.full(len(nz)*len(dest_wells), rxn, dtype = object))
+                transfers.append(pd.DataFrame({'Label': np.concatenate(labels),
+                                               'Layout': layout_id,
+                                               'Destination Well': np.concatenate(dest),
+                                               'Transfer Volume': np.concatenate(vols),
+                                               'Reaction': np.concatenate(rxns)}))
+
+        transfer_cols = ['Label', 'Layout', 'Destination Well', 'Transfer Volume', 'Reaction']
+        transfers = pd.concat(transfers, ignore_index = True) if transfers else pd.DataFrame(columns = transfer_cols)
+        transfer_vols = transfers['Transfer Volume'].to_numpy(dtype = np.float64)
+        plate_ids = pd.Series(plate_for[transfers['Label'].map(label_idx).to_numpy(dtype = np.int64)])
+
+        # assign source wells from the running volume of each component's transfers
+        source_wells = np.empty(len(transfers), dtype = object)
+        first_failed = len(transfers)
+        for component, indx in transfers.groupby('Label', sort = False).indices.items():
+            i = label_idx[component]
+            well_caps = np.array(vols_for[i], dtype = np.float64) - get_vol_min(plate_type[plate_for[i]-1])
+            slots, n_placed = fill_source_wells(transfer_vols[indx], well_caps)
+            if n_placed < len(indx):
+                first_failed = min(first_failed, indx[n_placed])
+            source_wells[indx] = np.array(wells_for[i])[slots]
+
+        if first_failed < len(transfers):
+            raise NameError('Need more volume of ' +transfers.loc[first_failed, 'Label']+ ' to complete reaction ' + transfers.loc[first_failed, 'Reaction'] + '. Add another well to source plate.')
+
+        used = pd.Series(transfer_vols).groupby((plate_ids.astype(str) + '_' + source_wells).to_numpy(), sort = False).sum()
+        vol_used.update(used.to_dict())
+
+        output_df = pd.DataFrame({'Source Plate Name': ('Source[' + plate_ids.astype(str) + ']').to_numpy(),
+                                  'Source Plate Type': [plate_type[p-1] for p in plate_ids],
+                                  'Source Well': source_wells,
+                                  'Destination Plate Name': ('Destination[' + (transfers['Layout'] + 1).astype(str) + ']').to_numpy(),
+                                  'Destination Well': transfers['Destination Well'].to_numpy(),
+                                  'Transfer Volume': transfer_vols*1000},
+                                  columns = OUT_COLS)
+
+
+        # per well summary, the minimum load is what the well needs for this protocol on top of the dead volume
+        summary = pd.DataFrame({'Well': list(vol_used), 'Used': myround(list(vol_used.values()))})
+        summary['Left'] = summary['Well'].map(vol_left) - summary['Used']
+        tracked = summary['Well'].isin(vol_left.keys())
+        vol_left.update(zip(summary['Well'][tracked], summary['Left'][tracked].tolist()))
+        dead_vol = np.array([get_vol_min(plate_type[int(w.split('_')[0])-1]) for w in summary['Well']])
+        summary['Load at least'] = np.round(dead_vol + summary['Used'], 2)
 
-        vol_used = {well:vol for well,vol in vol_used.items() if vol!=0}
         print('Volumes used from each well for this protocol:')
-        print(vol_used)
+        print(summary[summary['Used'] != 0].to_string(index = False))
 
         new_vol_list = ['']*len(source_plate_df)
         for k,v in vol_left.items():
-            row = (source_plate_df['PlateID']==int(k[0])*source_plate_df['Well'].str.contains(k[2:])).argmax()
-            new_vol_list[row] = new_vol_list[row] + str(v) + ','
+            new_vol_list[well_row[k]] = new_vol_list[well_row[k]] + str(v) + ','
 
         source_plate_df['New Volume'] = new_vol_list
         if update_source_vol: